@@ -0,0 +1,130 @@
+''' caching of node and prop rows, keyed by (guid, ctx).
+
+two layers, both off by default:
+
+- an identity map, scoped to a `with db.identity():` block (e.g. one web
+  request). inside it, every by_guid or related-node listing of the same guid
+  returns the same Node instance, so the current user loaded in five places is
+  fetched and built once.
+
+- a process-wide LRU of datahog rows, turned on with
+  `db.connect(..., cache_size=N, cache_ttl=seconds)`. rows read from the db
+  are kept for up to cache_ttl seconds and handed out as copies.
+
+writes made through databacon (save, increment, flag saves) drop the written
+row from the LRU, and remove drops the object from both. writes made by other
+processes are only seen once the entry expires, but Node.save still compares
+against the value it read, so a stale cached node fails with
+WillNotUpdateStaleNode instead of clobbering a newer value. '''
+
+import collections
+import contextlib
+import contextvars
+import copy
+import threading
+import time
+
+
+class LRU(object):
+  ''' a bounded, expiring map from key to row. '''
+
+  def __init__(self, size, ttl=None):
+    self.size = size
+    self.ttl = ttl
+    self.rows = collections.OrderedDict()
+    self.lock = threading.Lock()
+
+
+  def get(self, key):
+    with self.lock:
+      entry = self.rows.get(key)
+      if entry is None:
+        return None
+      expires, row = entry
+      if expires is not None and expires < time.monotonic():
+        del self.rows[key]
+        return None
+      self.rows.move_to_end(key)
+    return copy.deepcopy(row)
+
+
+  def put(self, key, row):
+    expires = self.ttl is not None and time.monotonic() + self.ttl or None
+    row = copy.deepcopy(row)
+    with self.lock:
+      self.rows[key] = (expires, row)
+      self.rows.move_to_end(key)
+      while len(self.rows) > self.size:
+        self.rows.popitem(last=False)
+
+
+  def discard(self, key):
+    with self.lock:
+      self.rows.pop(key, None)
+
+
+  def clear(self):
+    with self.lock:
+      self.rows.clear()
+
+
+_identity = contextvars.ContextVar('databacon_identity', default=None)
+rows = None
+
+
+def configure(size=0, ttl=None):
+  global rows
+  rows = size and LRU(size, ttl) or None
+
+
+@contextlib.contextmanager
+def identity():
+  ''' share Node instances by guid until the end of the block. nested blocks
+  join the outermost one. '''
+  if _identity.get() is not None:
+    yield _identity.get()
+    return
+
+  objs = {}
+  token = _identity.set(objs)
+  try:
+    yield objs
+  finally:
+    _identity.reset(token)
+
+
+def instance(key):
+  ''' the Node instance for key in the current identity map, if any '''
+  objs = _identity.get()
+  return objs is not None and objs.get(key) or None
+
+
+def remember(key, obj):
+  objs = _identity.get()
+  if objs is not None:
+    objs.setdefault(key, obj)
+  return objs is not None and objs[key] or obj
+
+
+def row(key):
+  return rows is not None and rows.get(key) or None
+
+
+def store(key, dh):
+  if rows is not None and dh:
+    rows.put(key, dh)
+
+
+def discard(key):
+  ''' drop a written row. the instance that wrote it stays in the identity
+  map, since it has the new value. '''
+  if rows is not None:
+    rows.discard(key)
+
+
+def forget(key):
+  ''' drop a removed object from both layers '''
+  discard(key)
+  objs = _identity.get()
+  if objs is not None:
+    objs.pop(key, None)
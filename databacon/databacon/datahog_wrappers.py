@@ -1,12 +1,18 @@
 import math
 import functools
+import time
 
 from datahog import node, alias, name, prop, relationship
-import gevent
+from datahog import error as dh_error
+from datahog.const import ordering, util as dh_util
 
 from . import exceptions as exc
+from . import cache
 from . import db
+from . import future
+from . import loader
 from . import metaclasses
+from . import unit
 from .flags import Flags
 
 _missing = node._missing
@@ -46,10 +52,18 @@ class Dict(object):
     return [self._dh[key] for key in self._remove_arg_strs]
 
 
+  @property
+  def _cache_key(self):
+    # only nodes and props are cached, see databacon.cache
+    return None
+
+
   def remove(self, **kw):
     # TODO test
     args = self._id_args + [self._ctx] + self._remove_args
-    return self._table.remove(db.pool, *args, **dhkw(kw))
+    removed = self._table.remove(db.pool, *args, **dhkw(kw))
+    cache.forget(self._cache_key)
+    return removed
 
   
   @classmethod
@@ -58,14 +72,25 @@ class Dict(object):
 
   
   def save_flags(self, add, clear, **kw):
+    t = unit.current()
+    if t is not None and self._table in (node, prop):
+      # queued in the enclosing db.txn(), see databacon.unit
+      queue = self._table is node and t.set_node_flags or t.set_prop_flags
+      queue(*(self._id_args + [self._ctx, add, clear]))
+      t.discard(self._cache_key)
+      return
+
     args = [db.pool] + self._id_args + [self._ctx, add, clear]
     res = self._table.set_flags(*args, **dhkw(kw))
+    cache.discard(self._cache_key)
     if res is None:
       raise Exception('flags not saved')
 
 
 class List(object, metaclass=metaclasses.ListMC):
   default_page_size = 100
+  # pages to fetch in the background while iterating, see __call__
+  read_ahead = 0
   of_type = None
   _owner = None
 
@@ -75,20 +100,73 @@ class List(object, metaclass=metaclasses.ListMC):
 
 
   def __getitem__(self, idx):
-    return self._wrap_result(
-      self._get_page(
-        db.pool, self._owner.guid, self.of_type._ctx, start=idx, limit=1)[0][0], edges='only')
+    ctx = self.of_type._ctx
+    if dh_util.ctx_ordering(ctx) == ordering.SPARSE:
+      # positions in sparse lists are spaced apart, so idx isn't one; read
+      # from the front instead
+      result = self._get_page(
+        db.pool, self._owner.guid, ctx, start=0, limit=idx + 1)[0][idx]
+    else:
+      result = self._get_page(
+        db.pool, self._owner.guid, ctx, start=idx, limit=1)[0][0]
+    return self._wrap_result(result, edges='only')
 
 
-  def __call__(self, **kw):
+  def __call__(self, read_ahead=None, **kw):
+    ''' iterate over the whole list, a page at a time. read_ahead=N (or
+    the class's read_ahead) keeps fetching up to N pages in the background
+    while the current one is consumed. '''
     # TODO test multipage results (there was a bug that cause infinite looping)
     kw.setdefault('start', 0)
     kw.setdefault('limit', self.default_page_size)
-    for page, offset in self._pages(**kw):
+    if read_ahead is None:
+      read_ahead = self.read_ahead
+    for page, offset in db.pool.read_ahead(self._pages(**kw), read_ahead):
       for result in page:
         yield self._wrap_result(result, edges=kw.get('edges', None))
+
+
+  def future(self, *args, **kw):
+    ''' a Future of the whole list, as list(self(...)) would return it, read
+    on a worker. see databacon.future. '''
+    return future.submit(lambda: list(self(*args, **kw)))
+
+
+  def __aiter__(self):
+    return self.aiter()
+
+
+  async def aiter(self, **kw):
+    ''' async version of __call__; each page is fetched on the pool's
+    executor, so this requires the asyncio backend. a fetch holds one of the
+    executor's threads, so only that many pages (across all callers) are
+    fetched at once. '''
+    kw.setdefault('start', 0)
+    kw.setdefault('limit', self.default_page_size)
+    pages = self._pages(**kw)
+    while True:
+      page = await db.run(next, pages, None)
+      if page is None:
+        return
+      for result in page[0]:
+        yield self._wrap_result(result, edges=kw.get('edges', None))
  
 
+  def __len__(self):
+    return self.count()
+
+
+  def count(self, **kw):
+    ''' the number of entries, read from a counter datahog keeps up to date
+    rather than by paging through them. '''
+    return self._count(
+      db.pool, self._owner.guid, self.of_type._ctx, **dhkw(kw))
+
+
+  def _count(self, *args, **kw):
+    return self.of_type._table.count(*args, **kw)
+
+
   def _wrap_result(self, result, edges=None):
     return self.of_type(dh=result, owner=self._owner)
 
@@ -104,9 +182,10 @@ class List(object, metaclass=metaclasses.ListMC):
         db.pool, self._owner.guid, self.of_type._ctx, **kw)
       if len(results):
         yield results, kw['start']
-      else:
-        raise StopIteration
-    raise StopIteration
+
+
+  async def aadd(self, *args, **kw):
+    return await db.run(self.add, *args, **kw)
 
 
   def add(self, value, flags=None, **kw):
@@ -122,17 +201,56 @@ class ValueDict(Dict, metaclass=metaclasses.ValueDictMC):
   ''' adds value access for datahog dicts that have values:
   nodes, props, names, and aliases '''
   schema = None
+  _pending = None
+  # whether old_value is the stored value, i.e. it was read or saved. until
+  # then only assigning a value makes it dirty
+  _synced = False
+  _assigned = False
 
 
   def __init__(self, *args, **kwargs):
+    synced = 'value' in (kwargs.get('dh') or {})
     kwargs.setdefault('dh', {}).setdefault('value', self.default_value())
     super(ValueDict, self).__init__(*args, **kwargs)
+    self._snapshot(synced)
+
+
+  def _snapshot(self, synced=True):
     if type(self.value) is dict:
       self.old_value = self.value.copy()
     elif type(self.value) is list:
       self.old_value = list(self.value)
     else:
       self.old_value = self.value
+    self._synced = synced
+    self._assigned = False
+    if self.flags._owner is self:
+      self.flags._snapshot(synced)
+
+
+  @property
+  def _value_dirty(self):
+    if self._synced:
+      return self.value != self.old_value
+    return self._assigned
+
+
+  @property
+  def dirty(self):
+    ''' whether the value or flags were changed since they were read or
+    saved '''
+    return self._value_dirty or self.flags.dirty
+
+
+  def _load(self, fetch, key, **kw):
+    ''' fetch our dh through the loader. inside db.batch() the read is
+    queued, and `value` waits for it. '''
+    self._pending = loader.load(fetch, key, self._resolve, **dhkw(kw))
+
+
+  def _resolve(self, dh):
+    self._pending = None
+    self._loaded(dh)
 
   def default_value(self):
     return ({
@@ -147,12 +265,15 @@ class ValueDict(Dict, metaclass=metaclasses.ValueDictMC):
 
   @property
   def value(self):
+    if self._pending is not None:
+      self._pending.wait()
     return self._dh.get('value')
 
 
   @value.setter
   def value(self, value):
     self._dh['value'] = value
+    self._assigned = True
 
 
   def __call__(self, value=_missing, force_overwrite=False, lazy=True, **kwargs):
@@ -174,12 +295,35 @@ class ValueDict(Dict, metaclass=metaclasses.ValueDictMC):
     
     args = self._id_args + [self._ctx]
     new_val = self._table.increment(db.pool, *args, **dhkw(kw))
+    cache.discard(self._cache_key)
     if new_val is None:
       raise exc.DoesNotExist(self)
     self.value = new_val 
+    self._snapshot()
     return self
 
 
+  def fetch_async(self, **kw):
+    ''' a Future of this object, with its value read on a worker. see
+    databacon.future. '''
+    return future.submit(self._fetch, **kw)
+
+
+  def _fetch(self, **kw):
+    self._get(**kw)
+    self.value # waits for a queued read
+    return self
+
+
+  async def aget(self, **kw):
+    await db.run(self._get, **kw)
+    return self
+
+
+  async def asave(self, **kw):
+    return await db.run(self.save, **kw)
+
+
 class GuidDict(Dict):
   _id_arg_strs = ('id',)
   _remove_arg_strs = ('id',)
@@ -203,6 +347,39 @@ class GuidDict(Dict):
     return self._dh.get('id', None)
 
 
+  @property
+  def _cache_key(self):
+    return (self.guid, self._ctx)
+
+
+  @classmethod
+  def _guid_key(cls, id):
+    return type(id) in (list, tuple) and tuple(id) or (id, cls._ctx)
+
+
+  @classmethod
+  def _cached(cls, id):
+    ''' the instance for id from the identity map, or one built from the
+    row cache, or None '''
+    key = cls._guid_key(id)
+    found = cache.instance(key)
+    if found is None:
+      dh = cache.row(key)
+      found = dh and cache.remember(key, cls(dh=dh)) or None
+    return found
+
+
+  @classmethod
+  def _identified(cls, dh, **kw):
+    ''' an instance for a freshly read dh, or the one already in the
+    identity map. None for a missing row. '''
+    if not dh:
+      return None
+    key = (dh['id'], dh.get('ctx', cls._ctx))
+    cache.store(key, dh)
+    return cache.instance(key) or cache.remember(key, cls(dh=dh, **kw))
+
+
   @classmethod
   def _by_guid(cls, ids, **kw):
     ids = type(ids) in (list, tuple) and ids or (ids,)
@@ -214,12 +391,91 @@ class GuidDict(Dict):
 
 
   @classmethod
-  def by_guid(cls, ids, **kw):
-    dicts = cls._by_guid(ids, **kw)
-    if type(ids) in (list, tuple):
-      return [cls(dh=dh) for dh in dicts]
+  def by_guid(cls, ids, props=None, **kw):
+    ''' props=['name', ...] also fills in those Prop attrs of every node,
+    see fetch_props. raises DoesNotExist if a guid has no node, whether it's
+    read alone or with others. '''
+    many = type(ids) in (list, tuple)
+    found = [cls._cached(id) for id in (many and ids or [ids])]
+    missing = [id for id, obj in zip(many and ids or [ids], found) if not obj]
+    if missing and many and not loader.batching():
+      dhs = cls._by_guid(missing, **kw)
+      for id, dh in zip(missing, dhs):
+        if not dh:
+          cache.forget(cls._guid_key(id))
+          raise exc.DoesNotExist(id)
+      loaded = [cls._identified(dh) for dh in dhs]
     else:
-      return cls(dh=dicts[0])
+      loaded = [cls._load_guid(id, **kw) for id in missing]
+    loaded = iter(loaded)
+    found = [obj or next(loaded) for obj in found]
+    if props:
+      cls.fetch_props(found, props, **kw)
+    return many and found or found[0]
+
+
+  @classmethod
+  def fetch_props(cls, nodes, names, **kw):
+    ''' fill in the named attrs of all of `nodes`, with one query per shard
+    for the props and one per shard for each alias or name (or, inside
+    db.batch(), as part of the batch). only singular props, aliases and names
+    can be fetched this way. '''
+    rows = [[getattr(node, name) for name in names] for node in nodes]
+    for attr in rows and rows[0] or ():
+      if not isinstance(attr, (Prop, LookupDict)):
+        raise TypeError('%r is not a prop, alias or name' % attr)
+
+    if loader.batching():
+      for row in rows:
+        for attr in row:
+          attr._get(**kw)
+      return
+
+    first = rows and rows[0] or ()
+    prop_cols = [i for i, attr in enumerate(first) if isinstance(attr, Prop)]
+    if prop_cols:
+      results = prop.batch_get_list(db.pool,
+                                    [node.guid for node in nodes],
+                                    [first[i]._ctx for i in prop_cols],
+                                    **dhkw(kw))
+      for row, dhs in zip(rows, results):
+        for i, dh in zip(prop_cols, dhs):
+          row[i]._loaded(dh)
+
+    for i, attr in enumerate(first):
+      if isinstance(attr, LookupDict):
+        dhs = attr._fetch([(node.guid, attr._ctx) for node in nodes],
+                          **dhkw(kw))
+        for row, dh in zip(rows, dhs):
+          row[i]._loaded(dh)
+
+
+  def fetch(self, *names, **kw):
+    ''' user.fetch('name', 'age') fills in several props in one query '''
+    self.fetch_props([self], names, **kw)
+    return self
+
+
+  @classmethod
+  def _load_guid(cls, id, **kw):
+    id, ctx = type(id) in (list, tuple) and id or (id, cls._ctx)
+    found = cache.remember((id, ctx), cls(dh={'id': id, 'ctx': ctx}))
+    found._load(loader.nodes, (id, ctx), **kw)
+    return found
+
+
+  def _loaded(self, dh):
+    if dh is None:
+      cache.forget(self._cache_key)
+      raise exc.DoesNotExist(self)
+    self._dh = dh
+    self._snapshot()
+    cache.store(self._cache_key, dh)
+
+
+  @classmethod
+  async def aby_guid(cls, ids, **kw):
+    return await db.run(cls.by_guid, ids, **kw)
     
 
 class PosDict(Dict):
@@ -291,7 +547,7 @@ class Relation(BaseIdDict, ValueDict, metaclass=metaclasses.RelationMC):
 
       if node:
         node_cls = self._node_cls()
-        node = node_cls(dh=node, owner=self._owner)
+        node = node_cls._identified(node, owner=self._owner)
       if edge:
         edge = self.of_type(dh=edge, owner=self._owner)
 
@@ -305,16 +561,71 @@ class Relation(BaseIdDict, ValueDict, metaclass=metaclasses.RelationMC):
       if edges not in (True, None, False, 'only'):
         raise Exception('Invalid `over` value. Pass one of `True`, `False`, `None`, or \'only\'')
 
-      for edges_page, offset in super(Relation.List, self)._pages(**kw):
-        if edges == 'only':
+      if edges == 'only':
+        for edges_page, offset in super(Relation.List, self)._pages(**kw):
           yield edges_page, offset
+        return
+
+      # relationships and their nodes come back together, in one query when
+      # the nodes are on the owner's shard
+      for page, offset in self._joined_pages(**kw):
+        if not edges:
+          yield [node for edge, node in page if node], offset
         else:
-          nodes = self._nodes_for_page(edges_page, edges=edges, **kw)
-          
-          if not edges:
-            yield nodes, offset
+          yield page, offset
+
+
+    def _joined_pages(self, **kw):
+      kw['forward'] = self.of_type.forward
+      if self.of_type.forward:
+        cls = self._node_cls()
+      else:
+        cls = self.of_type.base_cls
+      results = [None]
+      while len(results):
+        results, kw['start'] = relationship.list_nodes(
+          db.pool, self._owner.guid, self.of_type._ctx, node_ctx=cls._ctx,
+          **dhkw(kw))
+        if len(results):
+          yield results, kw['start']
+
+
+    def __call__(self, props=None, **kw):
+      ''' props=('title', ...) yields (relation, attrs) pairs without
+      loading the related nodes, see project. '''
+      if props:
+        kw.pop('edges', None)
+        return self.project(*props, edges=True, **kw)
+      return super(Relation.List, self).__call__(**kw)
+
+
+    def project(self, *names, edges=False, read_ahead=None, **kw):
+      ''' iterate over the related nodes' props, aliases or names without
+      reading the node rows, e.g. `for title, in user.docs.project('title')`.
+      yields a tuple of the named attrs per relation, or (relation, attrs)
+      pairs with edges=True. each page costs the relationship query and the
+      batched reads of fetch_props. '''
+      kw.setdefault('start', 0)
+      kw.setdefault('limit', self.default_page_size)
+      cls = self._node_cls() if self.of_type.forward else self.of_type.base_cls
+      id_key = self.of_type.forward and 'rel_id' or 'base_id'
+      if read_ahead is None:
+        read_ahead = self.read_ahead
+
+      def pages():
+        for page, offset in super(Relation.List, self)._pages(**kw):
+          # unloaded stand-ins, just enough to hang the attrs off of
+          nodes = [cls(dh={'id': rel[id_key], 'ctx': cls._ctx}) for rel in page]
+          cls.fetch_props(nodes, names, timeout=kw.get('timeout'))
+          yield page, nodes
+
+      for page, nodes in db.pool.read_ahead(pages(), read_ahead):
+        for rel, node in zip(page, nodes):
+          attrs = tuple(getattr(node, name) for name in names)
+          if edges:
+            yield self.of_type(dh=rel, owner=self._owner), attrs
           else:
-            yield list(zip(edges_page, nodes)), offset
+            yield attrs
 
 
     def _node_cls(self):
@@ -342,6 +653,11 @@ class Relation(BaseIdDict, ValueDict, metaclass=metaclasses.RelationMC):
       return super(Relation.List, self)._get_page(*args, **kw)
 
 
+    def _count(self, *args, **kw):
+      kw['forward'] = self.of_type.forward
+      return super(Relation.List, self)._count(*args, **kw)
+
+
     def get(self, other=None, guid=None, **kw):
       dh = relationship.get(
         db.pool,
@@ -361,6 +677,17 @@ class Relation(BaseIdDict, ValueDict, metaclass=metaclasses.RelationMC):
       else:
         base_id, rel_id = guid, self._owner.guid
 
+      t = unit.current()
+      if t is not None:
+        t.create_relationship(self.of_type._ctx,
+                              base_id,
+                              rel_id,
+                              value=value,
+                              forward_index=kw.get('forward_index'),
+                              reverse_index=kw.get('reverse_index'),
+                              flags=flags and flags._flags_set or None)
+        return True
+
       return relationship.create(db.pool, 
                                  self.of_type._ctx,
                                  base_id,
@@ -370,6 +697,23 @@ class Relation(BaseIdDict, ValueDict, metaclass=metaclasses.RelationMC):
                                  flags=flags and flags._flags_set or None,
                                  **dhkw(kw))
 
+    def add_many(self, others, value=None, flags=None, **kw):
+      ''' relate the owner to each of `others` (nodes or guids) with
+      multi-row inserts. returns a bool per item, False where the relation
+      already existed. '''
+      guids = [getattr(other, 'guid', other) for other in others]
+      if self.of_type.forward:
+        rows = [(self._owner.guid, guid, value) for guid in guids]
+      else:
+        rows = [(guid, self._owner.guid, value) for guid in guids]
+
+      return relationship.create_many(db.pool,
+                                      self.of_type._ctx,
+                                      rows,
+                                      flags=flags and flags._flags_set or None,
+                                      **dhkw(kw))
+
+
     def remove(self, other=None, guid=None):
       guid = other and other.guid or guid
       return relationship.remove(db.pool,
@@ -388,7 +732,15 @@ class Node(GuidDict, ValueDict, PosDict, metaclass=metaclasses.NodeMC):
   def __init__(self, *args, **kw):
     self.parent = kw.get('parent', None)
     had_dh = dh = kw.get('dh', None)
-    if not dh:
+    t = unit.current()
+    if not dh and t is not None:
+      value = kw.get('value', self.default_value())
+      op = t.create_node(self._ctx,
+                         value,
+                         base_id=getattr(self.parent, 'guid', None),
+                         index=kw.get('index'))
+      dh = {'id': op.id, 'ctx': self._ctx, 'value': value}
+    elif not dh:
       dh = node.create(db.pool, 
                        self._ctx,
                        kw.get('value', self.default_value()),
@@ -399,6 +751,51 @@ class Node(GuidDict, ValueDict, PosDict, metaclass=metaclasses.NodeMC):
       self.new(*args, **kw)
 
 
+  @classmethod
+  async def acreate(cls, *args, **kw):
+    return await db.run(cls, *args, **kw)
+
+
+  @classmethod
+  def create_many(cls, values, parent=None, **kw):
+    ''' create a node per value with multi-row inserts. `new` isn't called
+    on the created nodes. '''
+    dhs = node.create_many(db.pool,
+                           cls._ctx,
+                           list(values),
+                           base_id=getattr(parent, 'guid', None),
+                           **dhkw(kw))
+    return [cls(dh=dh, parent=parent) for dh in dhs]
+
+
+  @classmethod
+  def all(cls, ranges=None, batch=1000, **kw):
+    ''' every node of this class, read from all shards at once in batches
+    of up to `batch` per shard. ranges limits the scan, see split. '''
+    for nodes, token in cls.scan(ranges=ranges, batch=batch, **kw):
+      for found in nodes:
+        yield found
+
+
+  @classmethod
+  def scan(cls, ranges=None, batch=1000, **kw):
+    ''' like all, but yields (nodes, token) per batch. the token is
+    JSON-able, and passing it back as `ranges` resumes the scan after that
+    batch. scanned nodes skip the caches, which a full scan would only churn.
+    '''
+    for dhs, token in node.scan(
+        db.pool, cls._ctx, ranges=ranges, batch=batch, **dhkw(kw)):
+      yield [cls(dh=dh) for dh in dhs], token
+
+
+  @classmethod
+  def split(cls, parts, **kw):
+    ''' cut every shard's nodes of this class into `parts` id ranges, so
+    that separate workers can each scan some of them:
+    `Doc.all(ranges=Doc.split(8)[i::workers])`. '''
+    return node.split(db.pool, cls._ctx, parts, **dhkw(kw))
+
+
   def parent_guid(self):
     return 
 
@@ -411,38 +808,113 @@ class Node(GuidDict, ValueDict, PosDict, metaclass=metaclasses.NodeMC):
     return moved
 
 
+  def traverse(self, *hops, depth=1, limit=None, **kw):
+    ''' walk relations out from this node, e.g. user.traverse('friends',
+    'corpora') for the corpora of the user's friends. a hop is a relation
+    name, or a (name, flags) pair to only follow relations with those flags
+    set, and the hops are repeated depth times.
+
+    yields the newly reached nodes as a list per hop, each costing one
+    relationship query and one node query per shard. nodes already reached
+    aren't visited again, limit caps the relations followed per hop, and
+    timeout covers the whole walk. '''
+    cls, steps, targets = type(self), [], []
+    for hop in hops * depth:
+      hop_name, flags = type(hop) is tuple and hop or (hop, None)
+      rel = getattr(cls, hop_name).of_type
+      forward = rel.forward or not rel._meta.get('directed', True)
+      steps.append((rel._ctx, forward, flags and flags._flags_set or None))
+      if rel.forward:
+        cls = cls is rel.base_cls and rel.rel_cls or rel.base_cls
+      else:
+        cls = rel.base_cls
+      targets.append((cls, forward and 'rel_id' or 'base_id'))
+
+    timeout = kw.get('timeout')
+    deadline = timeout is not None and time.time() + timeout
+    levels = relationship.traverse(
+      db.pool, self.guid, steps, limit=limit, timeout=timeout)
+    for (cls, id_key), rels in zip(targets, levels):
+      if timeout is not None:
+        kw['timeout'] = max(deadline - time.time(), 0)
+      dhs = cls._by_guid([(rel[id_key], cls._ctx) for rel in rels], **kw)
+      yield [cls._identified(dh) for dh in dhs if dh]
+
+
   def save(self, force_overwrite=False, **kw):
-    old_value = force_overwrite and _missing or self.old_value
-    result = node.update(db.pool,
-                         self.guid,
-                         self._ctx,
-                         self.value,
-                         old_value=old_value,
-                         **dhkw(kw))
-    if not result:
+    ''' write what changed since the node was read or last saved: its value
+    and flags, and the values (and prop flags) of its props, aliases and
+    names. unchanged ones aren't written, and the rest go out together, in
+    one transaction per shard. names are written on their own once that has
+    committed, so inside a db.txn() block a changed name raises
+    NameNotQueued before anything is queued.
+
+    the value is only written if the stored one is still the one that was
+    read, unless force_overwrite, which also writes it if it's unchanged. '''
+    if unit.current() is not None:
+      if self._dirty_names():
+        raise exc.NameNotQueued()
+      self._save_changes(unit.current(), force_overwrite)
+      return self
+
+    names = self._dirty_names()
+    try:
+      with unit.txn(timeout=kw.get('timeout')) as t:
+        self._save_changes(t, force_overwrite)
+    except dh_error.StaleValue:
+      # a failed compare-and-set means our copy (cached or not) is stale
       if force_overwrite:
         raise exc.DoesNotExist(node)
-      else:
-        raise exc.WillNotUpdateStaleNode(node)
-    
-    self.old_value = self.value
+      raise exc.WillNotUpdateStaleNode(node)
+    for obj in names:
+      obj.save(**kw)
     return self
 
 
+  def _dirty_names(self):
+    return [obj for obj in map(self.__dict__.get, self._datahog_attrs)
+            if isinstance(obj, Name) and obj._value_dirty]
+
+
+  def _save_changes(self, t, force_overwrite):
+    if force_overwrite or self._value_dirty:
+      old_value = force_overwrite and _missing or self.old_value
+      t.update_node(self.guid, self._ctx, self.value, old_value=old_value)
+      t.discard(self._cache_key)
+      t.on_commit(self._snapshot)
+    if self.flags.dirty:
+      self.flags.save()
+
+    for attr in self._datahog_attrs:
+      obj = self.__dict__.get(attr)
+      if not isinstance(obj, ValueDict) or isinstance(obj, Name):
+        continue
+      if obj._value_dirty:
+        obj.save()
+      if obj._table is prop and obj.flags.dirty:
+        obj.flags.save()
+
+
 class LookupDict(BaseIdDict, ValueDict):
   _remove_arg_strs = ('value',)
+  _fetch = None
 
   def _get(self, **kw):
-    entries = self._table.list(db.pool, self.base_id, self._ctx, **dhkw(kw))[0]
-    if not entries:
+    self._load(self._fetch, (self.base_id, self._ctx), **kw)
+
+
+  def _loaded(self, entry):
+    if not entry:
       self._dh = {'base_id': self.base_id}
       return
-    self._fetched_value = entries[0]['value'] # for remove during save
-    self._dh = entries[0]
+    self._fetched_value = entry['value'] # for remove during save
+    self._dh = entry
+    self._snapshot()
 
 
 class Alias(LookupDict):
   _table = alias
+  _fetch = staticmethod(loader.aliases)
   _fetched_value = None
   uniq_to_rel = None
 
@@ -479,15 +951,46 @@ class Alias(LookupDict):
       if self.of_type.uniq_to_rel:
         # TODO wat is this
         args[3] = self._uniq_to_parent_val(args[3])
+      t = unit.current()
+      if t is not None:
+        kwargs.pop('timeout', None)
+        t.set_alias(*args[1:], **kwargs)
+        return True
       return alias.set(*args, **kwargs)
 
 
+    def add_many(self, values, flags=None, **kw):
+      ''' add several aliases to the owner at once. returns a bool per
+      value, False where the owner already had it. '''
+      if self.of_type.uniq_to_rel:
+        uniq_to = self.of_type(owner=self._owner).uniq_to
+        values = [guid_prefix(uniq_to, value) for value in values]
+      return alias.set_many(db.pool,
+                            self.of_type._ctx,
+                            [(self._owner.guid, value) for value in values],
+                            flags=flags and flags._flags_set or None,
+                            **dhkw(kw))
+
+
   def save(self, **kw):
-    # Q: does this need some dirty-checking logic?
-    if self._fetched_value:
-      alias.remove(
-        db.pool, self.base_id, self._ctx, self._fetched_value, **dhkw(kw))
-    alias.set(db.pool, self.base_id, self._ctx, self._dh['value'], **dhkw(kw))
+    if self._synced and not self._value_dirty:
+      return
+    t = unit.current()
+    if t is not None:
+      if self._fetched_value:
+        t.remove_alias(self.base_id, self._ctx, self._fetched_value)
+      t.set_alias(self.base_id, self._ctx, self._dh['value'])
+    else:
+      if self._fetched_value:
+        alias.remove(
+          db.pool, self.base_id, self._ctx, self._fetched_value, **dhkw(kw))
+      alias.set(db.pool, self.base_id, self._ctx, self._dh['value'], **dhkw(kw))
+    unit.after_save(self._stored)
+
+
+  def _stored(self):
+    self._fetched_value = self._dh['value']
+    self._snapshot()
 
 
   # TODO deal with scope_to_parent
@@ -502,6 +1005,7 @@ class Alias(LookupDict):
 
 class Name(LookupDict):
   _table = name
+  _fetch = staticmethod(loader.names)
 
   class List(List):
     add = name.create
@@ -514,6 +1018,12 @@ class Name(LookupDict):
 
 
   def save(self, **kw):
+    ''' names span lookup shards, and aren't queued by db.txn(): saving a
+    changed one inside a txn block raises NameNotQueued. '''
+    if self._synced and not self._value_dirty:
+      return
+    if unit.current() is not None:
+      raise exc.NameNotQueued()
     # it might happen that the user saves before fetching, 
     # in which case we need to remove the existing entry
     if not self._dh['value']:
@@ -521,6 +1031,7 @@ class Name(LookupDict):
       if existing_name and existing_name[0]['value']:
         name.remove(db.pool, self.base_id, self._ctx, existing_name['value'])
     name.create(db.pool, self.base_id, self._ctx, self.value, **dhkw(kw))
+    self._snapshot()
 
 
 class Prop(ValueDict, BaseIdDict):
@@ -532,15 +1043,30 @@ class Prop(ValueDict, BaseIdDict):
 
 
   def _get(self, **kw):
-    dh = prop.get(db.pool, self.base_id, self._ctx, **dhkw(kw))
+    dh = cache.row(self._cache_key)
     if dh:
       self._dh = dh
+      self._snapshot()
+      return
+    self._load(loader.props, (self.base_id, self._ctx), **kw)
+
+
+  def _loaded(self, dh):
+    if dh:
+      self._dh = dh
+      self._snapshot()
+      cache.store(self._cache_key, dh)
 
 
   @property
   def base_id(self):
     return super(Prop, self).base_id or self._owner.guid
 
+
+  @property
+  def _cache_key(self):
+    return (self.base_id, self._ctx)
+
   @property
   def _remove_args(self):
     if self.ignore_remove_race:
@@ -557,8 +1083,34 @@ class Prop(ValueDict, BaseIdDict):
 
 
   def save(self, **kwargs):
+    ''' write the value if it changed, returning (inserted, updated) like
+    prop.set. inside a db.txn() block the write is only queued, and both
+    are None until the block commits. '''
     # TODO old_value=_missing support for set (like node.update)
-    return prop.set(db.pool, self.base_id, self._ctx, self.value)
+    if self._synced and not self._value_dirty:
+      return False, False
+    t = unit.current()
+    if t is not None:
+      t.set_prop(self.base_id, self._ctx, self.value)
+      t.discard(self._cache_key)
+      t.on_commit(self._snapshot)
+      return None, None
+    saved = prop.set(db.pool, self.base_id, self._ctx, self.value)
+    cache.discard(self._cache_key)
+    self._snapshot()
+    return saved
+
+
+  @classmethod
+  def set_many(cls, pairs, **kw):
+    ''' User.age.set_many([(user, 30), ...]) sets the prop on many nodes
+    (or guids) with one upsert per shard. returns a bool per pair, False
+    where the node doesn't exist. '''
+    pairs = [(getattr(owner, 'guid', owner), value) for owner, value in pairs]
+    saved = prop.set_many(db.pool, cls._ctx, pairs, **dhkw(kw))
+    for guid, value in pairs:
+      cache.discard((guid, cls._ctx))
+    return saved
 
 
 class Lock(Prop):
@@ -566,7 +1118,7 @@ class Lock(Prop):
   
   def acquire(self, timeout=10., retry_after=1.):
     while not self.increment(limit=1):
-      gevent.sleep(retry_after)
+      db.pool._pause(retry_after * 1000)
       timeout -= retry_after
       if timeout <= 0:
         raise exc.LockAcquisitionTimeout()
@@ -590,7 +1142,10 @@ dh_kwargs = ['timeout',
              'index',
              'limit',
              'start',
-             'forward']
+             'forward',
+             'chunk',
+             'defer',
+             'progress']
 def dhkw(kw, blacklist=False):
   ''' Intersect or exclude datahog kwargs '''
   pass_thru = {}
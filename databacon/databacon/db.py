@@ -1,11 +1,90 @@
-from datahog.pool import GeventConnPool
+from datahog.pool import GeventConnPool, AsyncioConnPool
+
+from . import cache
+from . import future
+from . import loader
+from . import unit
+
+backends = {
+  'gevent': GeventConnPool,
+  'asyncio': AsyncioConnPool,
+}
 
 pool = None
-def connect(shard_config):
-  global pool 
-  pool = GeventConnPool(shard_config)
+def connect(shard_config, backend='gevent', coalesce=False, cache_size=0,
+            cache_ttl=None, workers=None):
+  ''' backend is 'gevent' (the default) or 'asyncio'. with asyncio, the
+  blocking databacon API still works from worker threads, and the a*-prefixed
+  methods (Node.aby_guid, node.asave, prop.aget, `async for` over lists...)
+  can be awaited from the event loop. they run on a thread pool sized to the
+  connection count (executor_workers in the shard config), which caps how
+  many are in flight at once.
+
+  coalesce=True sends reads made in the same scheduler tick together, see
+  databacon.loader.
+
+  cache_size > 0 keeps that many recently read node and prop rows in
+  process, for up to cache_ttl seconds, see databacon.cache.
+
+  workers bounds the greenlets (or threads) that run futures, see
+  databacon.future. '''
+  global pool
+  pool = backends[backend](shard_config)
+  loader.ticks = coalesce and loader.TickBatch() or None
+  cache.configure(cache_size, cache_ttl)
+  future.configure(workers)
   pool.start()
   if not pool.wait_ready(shard_config.get('timeout', 2.)):
     raise Exception("postgres connection timeout")
   return pool
 
+
+def batch():
+  ''' with db.batch(): ... queues prop, alias, name and by_guid reads until
+  the end of the block (or until a value is needed) and sends them as one
+  query per shard. '''
+  return loader.batch()
+
+
+def identity():
+  ''' with db.identity(): ... (e.g. around a request) returns the same Node
+  instance for every load of a guid inside the block. '''
+  return cache.identity()
+
+
+def txn(timeout=None):
+  ''' with db.txn(): ... queues node, prop, flag, alias and relation writes
+  until the end of the block and commits them together, or not at all. see
+  databacon.unit. '''
+  return unit.txn(timeout=timeout)
+
+
+async def run(func, *args, **kw):
+  ''' await a blocking databacon call on the asyncio pool's executor '''
+  return await pool.run(func, *args, **kw)
+
+
+def session(token):
+  ''' with db.session(user_id): ... sends reads to the primary for a few
+  seconds after that session writes, when shards are configured with
+  replicas. '''
+  return pool.session(token)
+
+
+def submit(func, *args, **kw):
+  ''' start any blocking databacon call on a worker, e.g.
+  db.submit(User.by_guid, guid), and return its Future. see
+  databacon.future. '''
+  return future.submit(func, *args, **kw)
+
+
+def gather(*futures, timeout=None):
+  ''' wait for futures (from list.future(), prop.fetch_async(), db.submit()
+  ...) that were started together, and return their results in order. '''
+  return future.gather(*futures, timeout=timeout)
+
+
+def combine(futures):
+  ''' a Future of the results of futures, for returning from a then()
+  step that starts several more. '''
+  return future.combine(futures)
@@ -17,6 +17,11 @@ class WillNotUpdateStaleNode(Exception):
   Either refresh the node before saving, or call node.save(force=True).'''
 
 
+class NameNotQueued(Exception):
+  message = '''Names aren't queued by db.txn(). Save a changed name before
+  or after the txn block.'''
+
+
 class FlagValueOverflow(Exception):
   def __init__(self, set_val, field_type, max_val):
     self.message = '%s is greater than the %s field\'s maximum value of %s.' % \
@@ -35,3 +40,7 @@ class UnknownFlagsEnumValue(Exception):
 
 class LockAcquisitionTimeout(Exception):
   message = 'Failed to acquire lock'
+
+
+class FutureTimeout(Exception):
+  message = 'The future did not finish in time'
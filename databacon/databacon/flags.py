@@ -3,6 +3,7 @@ import math
 from datahog.const import flag as dh_flag
 from .lang import Attrable
 from . import db
+from . import unit
 from functools import reduce
 
 
@@ -155,6 +156,7 @@ class Flags(object):
   def __init__(self, owner=None, fields=None):
     self._owner = owner # TODO weakref
     self._dirty_mask = set() # set of all flag values that need to be saved
+    self._saved = None # the stored flags, when known. see _snapshot
     if not fields:
       fields = owner and owner.__class__.flags.fields
     self._fields = fields
@@ -210,18 +212,40 @@ class Flags(object):
       return getattr(self, name)
 
 
+  def _snapshot(self, synced=True):
+    ''' remember the flags as stored (when they were just read or saved),
+    so that setting a field to the value it has isn't a change. '''
+    self._saved = None
+    if synced:
+      self._saved = set(self._flags_set)
+    self._dirty_mask = set()
+
+
   def _get_add_clear_flags(self):
     add, clear = [], []
+    saved = self._saved
     for flag in self._dirty_mask:
       if flag in self._flags_set:
-        add.append(flag)
-      else:
+        if saved is None or flag not in saved:
+          add.append(flag)
+      elif saved is None or flag in saved:
         clear.append(flag)
     return add, clear
 
 
+  @property
+  def dirty(self):
+    if self._owner is None:
+      return False
+    add, clear = self._get_add_clear_flags()
+    return bool(add or clear)
+
+
   def save(self, **kwargs):
-    self._owner.save_flags(*self._get_add_clear_flags())
-    self._dirty_mask = set()
+    add, clear = self._get_add_clear_flags()
+    if add or clear:
+      self._owner.save_flags(add, clear)
+    unit.after_save(
+      lambda synced=self._saved is not None: self._snapshot(synced))
       
 
@@ -0,0 +1,194 @@
+''' futures, for sending independent reads at the same time.
+
+every databacon call blocks its caller until its round trips are done. calls
+that don't depend on each other can instead be started as futures, which run
+on a bounded set of workers (greenlets or threads, whichever the pool uses)
+and are collected with db.gather:
+
+  corpora = user.corpora.future()
+  password = user.password.fetch_async()
+  username = user.username.fetch_async()
+  corpora, password, username = db.gather(corpora, password, username)
+
+a step that needs another's result is chained with then(), and is started as
+soon as that result is in, without holding up a worker while it waits. a
+page load is then one round trip per level of dependency, however many
+steps each level has:
+
+  docs = user.corpora.future().then(
+    lambda corpora: db.combine([c.docs.future() for c in corpora]))
+
+workers run with a copy of the caller's context, so db.session() and
+db.identity() blocks carry over to the steps started inside them. db.batch()
+and db.txn() blocks don't: a step's reads are sent and its writes committed
+on the spot. the number of workers is set with `db.connect(..., workers=N)`, and defaults to
+the number of connections in the shard config. '''
+
+import contextvars
+import threading
+
+from . import db
+from . import exceptions as exc
+from . import loader
+from . import unit
+
+
+class Future(object):
+  ''' the result of a call running on a worker. '''
+
+  def __init__(self):
+    self.ev = db.pool._ev()
+    self.lock = threading.Lock()
+    self.callbacks = []
+    self.finished = False
+    self.value = None
+    self.error = None
+
+
+  def done(self):
+    return self.finished
+
+
+  def result(self, timeout=None):
+    ''' wait for the call to finish, then return what it returned or raise
+    what it raised. raises FutureTimeout after `timeout` seconds. '''
+    if not self.finished and not self.ev.wait(timeout) and not self.finished:
+      raise exc.FutureTimeout()
+    if self.error is not None:
+      raise self.error
+    return self.value
+
+
+  def then(self, func):
+    ''' a Future of func(result), started once this one finishes. if func
+    returns a Future, the new one finishes with it. an error skips func and
+    is passed along. '''
+    chained = Future()
+
+    def start(f):
+      if f.error is not None:
+        chained._finish(error=f.error)
+      else:
+        executor.submit_to(chained, func, f.value)
+
+    self._add_callback(start)
+    return chained
+
+
+  def _add_callback(self, func):
+    with self.lock:
+      if not self.finished:
+        self.callbacks.append(func)
+        return
+    func(self)
+
+
+  def _finish(self, value=None, error=None):
+    if isinstance(value, Future):
+      value._add_callback(
+        lambda f: self._finish(value=f.value, error=f.error))
+      return
+
+    with self.lock:
+      if self.finished:
+        return
+      self.value, self.error = value, error
+      self.finished = True
+      callbacks, self.callbacks = self.callbacks, []
+    self.ev.set()
+    for func in callbacks:
+      func(self)
+
+
+class Executor(object):
+  ''' a bounded set of workers, started with the pool's _background on first
+  use, running calls from a queue. '''
+
+  def __init__(self, workers=None):
+    self.workers = workers
+    self.queue = None
+    self.lock = threading.Lock()
+
+
+  def submit(self, func, *args, **kw):
+    return self.submit_to(Future(), func, *args, **kw)
+
+
+  def submit_to(self, f, func, *args, **kw):
+    self._start()
+    ctx = contextvars.copy_context()
+    ctx.run(_detach)
+    self.queue.put((f, ctx, func, args, kw))
+    return f
+
+
+  def _start(self):
+    with self.lock:
+      if self.queue is not None:
+        return
+      self.queue = db.pool._q()
+      workers = self.workers or sum(
+        shard['count'] for shard in db.pool._dbconf['shards'])
+      for i in range(workers):
+        db.pool._background(self._work)
+
+
+  def _work(self):
+    while 1:
+      f, ctx, func, args, kw = self.queue.get()
+      try:
+        value = ctx.run(func, *args, **kw)
+      except Exception as e:
+        f._finish(error=e)
+      else:
+        f._finish(value=value)
+
+
+def _detach():
+  # the caller's batch and txn are dispatched by the caller, maybe before a
+  # worker gets to the step
+  loader._current.set(None)
+  unit._current.set(None)
+
+
+executor = None
+
+
+def configure(workers=None):
+  global executor
+  executor = Executor(workers)
+
+
+def submit(func, *args, **kw):
+  ''' start func(*args, **kw) on a worker, returning its Future '''
+  return executor.submit(func, *args, **kw)
+
+
+def combine(futures):
+  ''' a Future of the list of results of `futures`, without waiting for
+  them. it fails with the first error among them. '''
+  futures = list(futures)
+  combined = Future()
+  left = [len(futures)]
+  lock = threading.Lock()
+
+  def one_done(f):
+    if f.error is not None:
+      combined._finish(error=f.error)
+      return
+    with lock:
+      left[0] -= 1
+      last = left[0] == 0
+    if last:
+      combined._finish(value=[f.value for f in futures])
+
+  if not futures:
+    combined._finish(value=[])
+  for f in futures:
+    f._add_callback(one_done)
+  return combined
+
+
+def gather(*futures, timeout=None):
+  ''' wait for all of `futures`, and return their results in order '''
+  return combine(futures).result(timeout)
@@ -0,0 +1,189 @@
+''' coalescing of databacon reads into batched datahog queries.
+
+reads made by the wrappers (Prop and Alias/Name values, Node.by_guid) go
+through `load`. normally that's just the datahog call, made on the spot. inside
+a `with db.batch():` block they're queued instead, and the objects they'd fill
+in are left pending; the whole queue is sent at the end of the block, or as
+soon as a pending value is needed, as one multi-key query per shard:
+
+  with db.batch():
+    titles = [doc.title() for doc in corpus.docs()]
+  [t.value for t in titles]
+
+with `db.connect(..., coalesce=True)`, reads made outside of a batch block
+still block their caller, but those made by other greenlets (or threads) in
+the same scheduler tick are sent along with them. '''
+
+import contextlib
+import contextvars
+import threading
+
+from datahog import alias, name, node, prop
+
+from . import db
+
+
+class Pending(object):
+  ''' a queued read. callbacks get the result once it's fetched. '''
+
+  def __init__(self, batch):
+    self.batch = batch
+    self.callbacks = []
+    self.done = False
+    self.error = None
+    self.ev = None
+
+
+  def resolve(self, result=None, error=None):
+    self.error = error
+    if error is None:
+      for callback in self.callbacks:
+        try:
+          callback(result)
+        except Exception as e:
+          self.error = e
+    self.done = True
+    if self.ev is not None:
+      self.ev.set()
+
+
+  def wait(self):
+    if not self.done:
+      self.batch.wait(self)
+    if self.error is not None:
+      raise self.error
+
+
+class Batch(object):
+  ''' reads queued by key, for each fetch function. '''
+
+  def __init__(self):
+    self.queues = {}
+    self.lock = threading.Lock()
+
+
+  def load(self, fetch, key, apply):
+    with self.lock:
+      queue = self.queues.setdefault(fetch, {})
+      if key not in queue:
+        queue[key] = self._pending()
+      queue[key].callbacks.append(apply)
+      return queue[key]
+
+
+  def _pending(self):
+    return Pending(self)
+
+
+  def wait(self, pending):
+    self.dispatch()
+
+
+  def dispatch(self):
+    with self.lock:
+      queues, self.queues = self.queues, {}
+
+    for fetch, queue in queues.items():
+      keys = list(queue)
+      try:
+        results = fetch(keys)
+      except Exception as e:
+        for pending in queue.values():
+          pending.resolve(error=e)
+        continue
+      for key, result in zip(keys, results):
+        queue[key].resolve(result)
+
+
+class TickBatch(Batch):
+  ''' a batch that dispatches itself in the background. the first read queued
+  schedules the dispatch, so everything queued before the scheduler gets to
+  it goes in the same round trip. '''
+
+  def __init__(self):
+    super(TickBatch, self).__init__()
+    self.scheduled = False
+
+
+  def load(self, fetch, key, apply):
+    pending = super(TickBatch, self).load(fetch, key, apply)
+    with self.lock:
+      if not self.scheduled:
+        self.scheduled = True
+        db.pool._background(self._run)
+    return pending
+
+
+  def _pending(self):
+    pending = Pending(self)
+    pending.ev = db.pool._ev()
+    return pending
+
+
+  def wait(self, pending):
+    pending.ev.wait()
+
+
+  def _run(self):
+    db.pool._pause(0)
+    with self.lock:
+      self.scheduled = False
+    self.dispatch()
+
+
+_current = contextvars.ContextVar('databacon_batch', default=None)
+ticks = None
+
+
+@contextlib.contextmanager
+def batch():
+  ''' queue reads until the end of the block. nested blocks join the
+  outermost one. '''
+  if _current.get() is not None:
+    yield _current.get()
+    return
+
+  b = Batch()
+  token = _current.set(b)
+  try:
+    yield b
+  finally:
+    _current.reset(token)
+  b.dispatch()
+
+
+def batching():
+  return _current.get() is not None
+
+
+def load(fetch, key, apply, **kw):
+  ''' read `key` with `fetch` (a function of a list of keys, returning a list
+  of results) and pass the result to `apply`. returns a Pending if the read
+  was queued, None if it was done on the spot. kw (e.g. timeout) only applies
+  to reads done on the spot. '''
+  b = _current.get() or ticks
+  if b is None:
+    apply(fetch([key], **kw)[0])
+    return None
+
+  pending = b.load(fetch, key, apply)
+  if b is ticks:
+    pending.wait()
+    return None
+  return pending
+
+
+def props(keys, **kw):
+  return prop.batch_get(db.pool, keys, **kw)
+
+
+def nodes(keys, **kw):
+  return node.batch_get(db.pool, keys, **kw)
+
+
+def aliases(keys, **kw):
+  return alias.batch(db.pool, keys, **kw)
+
+
+def names(keys, **kw):
+  return name.batch(db.pool, keys, **kw)
@@ -0,0 +1,93 @@
+''' unit-of-work transactions.
+
+every databacon write is normally its own datahog call, committed on the spot.
+inside a `with db.txn():` block, node creates and saves, prop saves, flag
+saves, alias saves and relation adds are queued instead, and sent at the end
+of the block as one transaction per shard, committed together:
+
+  with db.txn():
+    user = User()
+    user.password('hunter2')
+    user.username('cam')
+    corpus.user.add(user)
+
+either all of them are applied or none are. an exception raised inside the
+block discards the queue, and a write that fails at commit (a stale node, an
+alias owned by another node...) raises from the end of the block after
+rolling back the rest. new nodes get their guid right away, so they can be
+related, aliased and so on inside the block.
+
+removes and the bulk methods are not queued, and still run on the spot.
+names aren't either, and since they would escape the rollback, saving a
+changed name inside the block raises NameNotQueued. see datahog.unit. '''
+
+import contextlib
+import contextvars
+
+from datahog.unit import UnitOfWork
+
+from . import cache
+from . import db
+
+
+class Txn(UnitOfWork):
+  ''' a datahog UnitOfWork that also drops the rows it wrote from the
+  databacon row cache, and lets the objects it wrote know once it commits. '''
+
+  def __init__(self, pool, timeout=None):
+    super(Txn, self).__init__(pool, timeout=timeout)
+    self.written = []
+    self.callbacks = []
+
+
+  def discard(self, key):
+    self.written.append(key)
+
+
+  def on_commit(self, func):
+    self.callbacks.append(func)
+
+
+  def commit(self):
+    try:
+      super(Txn, self).commit()
+    finally:
+      for key in self.written:
+        cache.discard(key)
+    for func in self.callbacks:
+      func()
+
+
+_current = contextvars.ContextVar('databacon_txn', default=None)
+
+
+@contextlib.contextmanager
+def txn(timeout=None):
+  ''' queue writes until the end of the block, then commit them together.
+  nested blocks join the outermost one. '''
+  if _current.get() is not None:
+    yield _current.get()
+    return
+
+  t = Txn(db.pool, timeout=timeout)
+  token = _current.set(t)
+  try:
+    yield t
+  finally:
+    _current.reset(token)
+  t.commit()
+
+
+def current():
+  ''' the Txn of the enclosing `with db.txn():` block, or None '''
+  return _current.get()
+
+
+def after_save(func):
+  ''' call func once the current write is stored: at the end of the
+  enclosing db.txn() block if there is one, right away otherwise. '''
+  t = _current.get()
+  if t is None:
+    func()
+  else:
+    t.on_commit(func)
@@ -0,0 +1,76 @@
+''' shared setup for the tests that run without a database.
+
+datahog's api functions are patched per test; the pool here only provides
+the scheduling hooks databacon uses directly (background tasks, events,
+queues and pauses), with real threads. '''
+
+import os
+import queue
+import sys
+import threading
+import time
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+sys.path.insert(0, os.path.join(here, '..', '..', 'vendor', 'datahog'))
+
+import databacon
+from databacon import cache, db, future, loader, unit
+from datahog.pool import ConnectionPool
+
+
+class FakePool(object):
+  readonly = False
+  _dbconf = {'shards': [{'count': 2}]}
+
+  def __init__(self):
+    self.threads = []
+
+
+  def _background(self, func):
+    t = threading.Thread(target=func)
+    t.daemon = True
+    t.start()
+    self.threads.append(t)
+
+
+  def _ev(self):
+    return threading.Event()
+
+
+  def _q(self):
+    return queue.Queue()
+
+
+  def _pause(self, ms):
+    time.sleep(ms / 1000.0)
+
+
+  # the real one, run on the hooks above
+  read_ahead = ConnectionPool.read_ahead
+
+
+class Doc(databacon.Node):
+  flags = databacon.flags()
+  flags.starred = databacon.flag.bool(False)
+
+  title = databacon.prop(str)
+  views = databacon.prop(int)
+  slug = databacon.lookup.alias()
+  links = databacon.relation('Doc')
+
+
+def doc_row(id, value=None):
+  return {'id': id, 'ctx': Doc._ctx, 'value': value, 'flags': set()}
+
+
+class TestCase(unittest.TestCase):
+  def setUp(self):
+    was = db.pool
+    db.pool = self.pool = FakePool()
+    loader.ticks = None
+    cache.configure()
+    future.configure()
+    self.addCleanup(setattr, db, 'pool', was)
+    self.addCleanup(cache.configure)
@@ -26,6 +26,7 @@ sys.excepthook = info
 import time
 import random
 
+from databacon import db
 from schema import User, Corpus, Doc, Term
 
 uniq = lambda s: '%s-%s-%s' % (s, time.time(), random.random())
@@ -66,6 +67,10 @@ for corpus in user0.corpora():
   for doc in docs:
     assert doc.guid in (doc0.guid, doc1.guid, doc2.guid)
 
+# Pages can be fetched ahead in the background while iterating
+assert [d.guid for d in corpus0.docs(limit=1, read_ahead=2)] == \
+  [d.guid for d in corpus0.docs()]
+
 
 # Updating Node Values
 doc0(value={'path': 'one'})
@@ -160,6 +165,50 @@ user0.password.flags.two_factor = True
 user0.password.flags.save()
 assert user0.password().flags.two_factor == True
 
+# Batched reads are queued and sent together at the end of the block
+user1.password('other_password')
+with db.batch():
+  users = User.by_guid([user0.guid, user1.guid])
+  passwords = [user.password() for user in users]
+  usernames = [user.username() for user in users]
+assert [p.value for p in passwords] == ['newer_password', 'other_password']
+assert usernames[0].value == username.value
+
+# Fetching several props, on one node or many, in one query per shard
+assert user0.fetch('password').password.value == 'newer_password'
+users = User.by_guid([user0.guid, user1.guid], props=['password'])
+assert [u.password.value for u in users] == ['newer_password', 'other_password']
+
+# Projecting attrs of related nodes, without loading the nodes themselves
+titles = dict((t.base_id, t.value) for t, in corpus0.docs.project('title'))
+assert titles[doc0.guid] == title
+for rel, (pw,) in corpus0.user(props=('password',)):
+  assert pw.value == 'newer_password'
+
+# Inside an identity block, a guid always loads as the same instance
+with db.identity():
+  assert User.by_guid(user0.guid) is User.by_guid([user0.guid])[0]
+  assert list(corpus0.user())[0] is User.by_guid(user0.guid)
+
+# Bulk creation: many nodes, props, aliases or relations per statement
+docs = Doc.create_many([{'path': '/bulk/%d' % i} for i in range(3)])
+assert [d.value['path'] for d in docs] == ['/bulk/0', '/bulk/1', '/bulk/2']
+
+# Scanning every node of a class, whole or split into ranges for workers
+all_guids = set(d.guid for d in Doc.all(batch=2))
+assert set(d.guid for d in docs) <= all_guids
+assert set(d.guid for d in Doc.all(ranges=Doc.split(3))) == all_guids
+assert corpus1.docs.add_many(docs) == [True, True, True]
+assert corpus1.docs.add_many(docs[:1]) == [False]
+assert len(list(corpus1.docs())) == 3
+assert len(corpus1.docs) == corpus1.docs.count() == 3
+assert User.password.set_many([(user1, 'bulk'), (user2.guid, 'bulk')]) == [True, True]
+assert user2.password().value == 'bulk'
+bulk_emails = [uniq('bulk@'), uniq('bulk@')]
+assert user2.emails.add_many(bulk_emails) == [True, True]
+assert sorted(e.value for e in user2.emails()) == sorted(bulk_emails)
+assert len(user2.emails) == 2
+
 
 ###
 ### Relationships
@@ -183,6 +232,10 @@ for score, node in doc0.scores(edges=True):
 # Access single relations
 assert doc0.scores[0].rel_id == doc1.guid
 
+# Counting relations reads a maintained counter, not the list
+assert len(doc0.scores) == 1
+assert len(doc1.scores) == 1 # undirected
+
 # Modify relation order
 # (Careful! O(N) db ops with number of displaced relations.)
 score1_int = 2
@@ -191,6 +244,10 @@ assert doc0.scores[1].flags.similarity == score1_int
 doc0.scores[1].shift(0)
 assert doc0.scores[0].flags.similarity == score1_int
 
+# Multi-hop traversal: each hop is one query per shard, visited nodes skipped
+levels = list(doc1.traverse('scores', depth=2))
+assert [[d.guid for d in level] for level in levels] == [[doc0.guid], [doc2.guid]]
+
 
 # Relationships & Incrementing an Integer Schema
 doc0_term_count = 3 # imagine that "word" occurs 3 times in doc0
@@ -250,6 +307,77 @@ term.docs[0](value)
 assert list(value.items())[0] in list(term.docs[0].value.items())
 assert list(value.items())[0] in [list(edge.value.items()) for edge in term.docs[0].node().terms(edges='only') if edge.rel_id == term.guid][0]
 
+
+# Writes inside a txn block are committed together, or not at all
+with db.txn():
+  doc3 = Doc(value={'path': '/txn/3'})
+  doc3.corpus.add(corpus0)
+  user2.password('in a txn')
+assert Doc.by_guid(doc3.guid).value['path'] == '/txn/3'
+assert User.by_guid(user2.guid).password().value == 'in a txn'
+exc = None
+try:
+  with db.txn():
+    doc4 = Doc(value={'path': '/txn/4'})
+    user2.password('rolled back')
+    raise ValueError()
+except ValueError as e:
+  exc = e
+assert exc != None
+assert User.by_guid(user2.guid).password().value == 'in a txn'
+# a queued prop save can't know yet whether it inserts or updates
+with db.txn():
+  user2.password.value = 'queued'
+  assert user2.password.save() == (None, None)
+assert user2.password.save() == (False, False)
+assert User.by_guid(user2.guid).password().value == 'queued'
+
+
+# node.save() writes whatever changed on the node and its attrs, and
+# nothing else
+doc3 = Doc.by_guid(doc3.guid)
+assert not doc3.dirty
+doc3.value['path'] = '/txn/3/saved'
+user2 = User.by_guid(user2.guid)
+user2.password()
+user2.password.value = 'saved with the node'
+user2.flags.newsletter_sub = True
+assert user2.dirty and user2.password.dirty
+doc3.save()
+user2.save()
+assert not user2.dirty and not user2.password.dirty
+assert Doc.by_guid(doc3.guid).value['path'] == '/txn/3/saved'
+fresh = User.by_guid(user2.guid)
+assert fresh.password().value == 'saved with the node'
+assert fresh.flags.newsletter_sub == True
+assert fresh.password('saved with the node') and not fresh.password.dirty
+
+
+# Independent reads started as futures go out at the same time, and
+# dependent ones are chained
+corpora, password, name = db.gather(user0.corpora.future(),
+                                    user0.password.fetch_async(),
+                                    user0.username.fetch_async())
+assert [c.guid for c in corpora] == [corpus0.guid]
+assert password.value == 'newer_password'
+assert name.value == username.value
+docs = user0.corpora.future().then(
+  lambda corpora: db.combine([c.docs.future() for c in corpora]))
+assert len(docs.result()[0]) == len(list(corpus0.docs()))
+assert db.submit(Doc.by_guid, doc0.guid).result().guid == doc0.guid
+
+
+# Removing a subtree a chunk at a time, reporting progress along the way
+rounds = []
+assert corpus1.remove(chunk=2, progress=rounds.append) == True
+assert rounds and rounds[-1]['pending'] == 0
+exc = None
+try:
+  Corpus.by_guid(corpus1.guid)
+except Exception as e:
+  exc = e
+assert exc != None
+
 ''' 
 TODO
 - test index manipulation for names/aliases/rels
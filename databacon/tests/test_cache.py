@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+from base import Doc, doc_row
+
+from datahog import node
+from databacon import cache, db
+from databacon import exceptions as exc
+
+
+class ByGuidTests(base.TestCase):
+  def setUp(self):
+    super(ByGuidTests, self).setUp()
+    self.rows = {0x101: doc_row(0x101, {'n': 1})}
+    for name, func in [
+        ('batch_get', lambda pool, keys, **kw:
+          [self.rows.get(id) for id, ctx in keys]),
+        ('create', mock.Mock(side_effect=AssertionError('created a node')))]:
+      patcher = mock.patch.object(node, name, func)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+
+  def test_missing_guid_in_a_batch_creates_nothing(self):
+    self.assertRaises(exc.DoesNotExist, Doc.by_guid, [0x101, 0x102])
+    self.assertFalse(node.create.called)
+
+
+  def test_missing_guid_in_a_txn_queues_nothing(self):
+    with mock.patch('databacon.unit.Txn.create_node') as create_node:
+      with self.assertRaises(exc.DoesNotExist):
+        with db.txn():
+          Doc.by_guid([0x102])
+    self.assertFalse(create_node.called)
+
+
+  def test_single_and_batch_agree(self):
+    self.assertRaises(exc.DoesNotExist, lambda: Doc.by_guid(0x102).value)
+    self.assertEqual([d.value for d in Doc.by_guid([0x101])], [{'n': 1}])
+
+
+  def test_identity_map(self):
+    with db.identity():
+      first = Doc.by_guid([0x101])[0]
+      self.assertIs(Doc.by_guid(0x101), first)
+      self.assertIs(Doc.by_guid([0x101])[0], first)
+    self.assertIsNot(Doc.by_guid([0x101])[0], first)
+
+
+class LRUTests(unittest.TestCase):
+  def test_evicts_least_recently_used(self):
+    lru = cache.LRU(2)
+    lru.put('a', {'v': 1})
+    lru.put('b', {'v': 2})
+    lru.get('a')
+    lru.put('c', {'v': 3})
+
+    self.assertEqual(list(lru.rows), ['a', 'c'])
+    self.assertIsNone(lru.get('b'))
+
+
+  def test_hands_out_copies(self):
+    lru = cache.LRU(2)
+    row = {'value': {'n': 1}}
+    lru.put('a', row)
+    row['value']['n'] = 2
+    lru.get('a')['value']['n'] = 3
+    self.assertEqual(lru.get('a'), {'value': {'n': 1}})
+
+
+  def test_expiry(self):
+    lru = cache.LRU(2, ttl=10)
+    lru.put('a', {})
+    with mock.patch('time.monotonic', return_value=time.monotonic() + 11):
+      self.assertIsNone(lru.get('a'))
+    self.assertEqual(len(lru.rows), 0)
+
+
+  def test_discard(self):
+    lru = cache.LRU(2)
+    lru.put('a', {})
+    lru.discard('a')
+    lru.discard('b')
+    self.assertIsNone(lru.get('a'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+from base import Doc, doc_row
+
+from datahog import alias, node, prop, relationship
+from databacon import db
+
+
+class FetchTests(base.TestCase):
+  ''' props, aliases and names of many nodes read together, with datahog's
+  batched reads patched to answer from `values` '''
+
+  def setUp(self):
+    super(FetchTests, self).setUp()
+    self.ids = [0x101, 0x102, 0x203]
+    self.values = {}
+    for id in self.ids:
+      self.values[(id, Doc.title._ctx)] = 'title %x' % id
+      self.values[(id, Doc.views._ctx)] = id
+      self.values[(id, Doc.slug._ctx)] = 'slug-%x' % id
+
+    self.calls = []
+    for mod, name, func in [
+        (prop, 'batch_get_list', self.batch_get_list),
+        (prop, 'batch_get', self.batch),
+        (alias, 'batch', self.batch),
+        (node, 'batch_get', lambda pool, keys, **kw:
+          self.called('node.batch_get') or
+          [doc_row(id) for id, ctx in keys]),
+        (relationship, 'list', self.list)]:
+      patcher = mock.patch.object(mod, name, func)
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+
+  def called(self, name):
+    self.calls.append(name)
+
+
+  def row(self, id, ctx):
+    if (id, ctx) in self.values:
+      return {'base_id': id, 'ctx': ctx, 'value': self.values[(id, ctx)],
+              'flags': set()}
+
+
+  def batch_get_list(self, pool, ids, ctxs, **kw):
+    self.called('batch_get_list')
+    return [[self.row(id, ctx) for ctx in ctxs] for id in ids]
+
+
+  def batch(self, pool, keys, **kw):
+    self.called('batch')
+    return [self.row(id, ctx) for id, ctx in keys]
+
+
+  def list(self, pool, id, ctx, forward=True, limit=100, start=0, **kw):
+    self.called('relationship.list')
+    rels = [{'base_id': id, 'rel_id': rel_id, 'ctx': ctx, 'value': None,
+             'flags': set(), 'pos': pos}
+            for pos, rel_id in enumerate(self.ids)][start:start + limit]
+    return rels, start + len(rels)
+
+
+  def test_fetch_props_of_many_nodes(self):
+    docs = [Doc(dh=doc_row(id)) for id in self.ids]
+    Doc.fetch_props(docs, ['title', 'views', 'slug'])
+
+    # one read for the props, one for the alias
+    self.assertEqual(self.calls, ['batch_get_list', 'batch'])
+    self.assertEqual([(d.title.value, d.views.value, d.slug.value)
+                      for d in docs],
+                     [('title 101', 0x101, 'slug-101'),
+                      ('title 102', 0x102, 'slug-102'),
+                      ('title 203', 0x203, 'slug-203')])
+
+
+  def test_fetch_props_in_a_batch(self):
+    docs = [Doc(dh=doc_row(id)) for id in self.ids]
+    with db.batch():
+      Doc.fetch_props(docs, ['title'])
+      self.assertEqual(self.calls, [])
+    self.assertEqual(self.calls, ['batch'])
+    self.assertEqual(docs[2].title.value, 'title 203')
+
+
+  def test_by_guid_with_props(self):
+    docs = Doc.by_guid(self.ids, props=['title'])
+    self.assertEqual(self.calls, ['node.batch_get', 'batch_get_list'])
+    self.assertEqual(docs[1].title.value, 'title 102')
+
+
+  def test_only_props_aliases_and_names(self):
+    docs = [Doc(dh=doc_row(id)) for id in self.ids]
+    self.assertRaises(TypeError, Doc.fetch_props, docs, ['links'])
+
+
+  def test_project_doesnt_read_the_nodes(self):
+    doc = Doc(dh=doc_row(0x1))
+    projected = [(title.value, slug.value)
+                 for title, slug in doc.links.project('title', 'slug')]
+
+    self.assertEqual(projected, [('title 101', 'slug-101'),
+                                 ('title 102', 'slug-102'),
+                                 ('title 203', 'slug-203')])
+    self.assertNotIn('node.batch_get', self.calls)
+
+
+  def test_project_pages_read_ahead(self):
+    doc = Doc(dh=doc_row(0x1))
+    pairs = list(doc.links.project('views', edges=True, limit=2,
+                                   read_ahead=1))
+
+    self.assertEqual([(rel.rel_id, views.value) for rel, (views,) in pairs],
+                     [(id, id) for id in self.ids])
+    # two pages and the empty one that ends the list, each page's props
+    # read with it
+    self.assertEqual(self.calls, ['relationship.list', 'batch_get_list'] * 2
+                     + ['relationship.list'])
+    self.assertEqual(len(self.pool.threads), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
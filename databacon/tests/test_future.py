@@ -0,0 +1,130 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+
+from databacon import db, future, loader
+from databacon import exceptions as exc
+
+
+tag = contextvars.ContextVar('tag', default=None)
+
+
+class FutureTests(base.TestCase):
+  def test_result(self):
+    self.assertEqual(db.submit(lambda a, b: a + b, 1, b=2).result(5), 3)
+
+
+  def test_error(self):
+    f = db.submit(lambda: 1 / 0)
+    self.assertRaises(ZeroDivisionError, f.result, 5)
+    self.assertTrue(f.done())
+
+
+  def test_timeout(self):
+    gate = threading.Event()
+    self.addCleanup(gate.set)
+    f = db.submit(gate.wait)
+    self.assertRaises(exc.FutureTimeout, f.result, 0.01)
+    self.assertFalse(f.done())
+
+
+  def test_then(self):
+    f = db.submit(lambda: 2).then(lambda x: x * 10)
+    self.assertEqual(f.result(5), 20)
+
+
+  def test_then_a_future(self):
+    f = db.submit(lambda: 2).then(lambda x: db.submit(lambda: x + 1))
+    self.assertEqual(f.result(5), 3)
+
+
+  def test_errors_skip_then(self):
+    called = []
+    f = db.submit(lambda: 1 / 0).then(called.append).then(called.append)
+    self.assertRaises(ZeroDivisionError, f.result, 5)
+    self.assertEqual(called, [])
+
+
+  def test_then_doesnt_hold_a_worker(self):
+    future.configure(workers=1)
+    waiting = future.Future()
+    chained = waiting.then(lambda x: x + 1)
+
+    # the only worker is free while chained waits
+    self.assertEqual(db.submit(lambda: 'free').result(5), 'free')
+    waiting._finish(value=1)
+    self.assertEqual(chained.result(5), 2)
+
+
+  def test_combine_keeps_order(self):
+    gate = threading.Event()
+    slow = db.submit(lambda: gate.wait(5) and 'slow')
+    fast = db.submit(lambda: 'fast')
+    combined = db.combine([slow, fast])
+    fast.result(5)
+    self.assertFalse(combined.done())
+
+    gate.set()
+    self.assertEqual(combined.result(5), ['slow', 'fast'])
+    self.assertEqual(db.combine([]).result(), [])
+
+
+  def test_combine_fails_with_the_first_error(self):
+    gate = threading.Event()
+    self.addCleanup(gate.set)
+    combined = db.combine(
+      [db.submit(gate.wait), db.submit(lambda: 1 / 0)])
+    # without waiting for the rest
+    self.assertRaises(ZeroDivisionError, combined.result, 5)
+
+
+  def test_gather(self):
+    self.assertEqual(db.gather(db.submit(lambda: 1), db.submit(lambda: 2),
+                               timeout=5), [1, 2])
+
+
+  def test_workers_are_bounded(self):
+    future.configure(workers=2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+    gate = threading.Event()
+
+    def step():
+      with lock:
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+      gate.wait(5)
+      with lock:
+        running[0] -= 1
+
+    futures = [db.submit(step) for i in range(5)]
+    deadline = time.time() + 5
+    while running[0] < 2:
+      self.assertLess(time.time(), deadline)
+      time.sleep(0.001)
+    # the other three stay queued
+    time.sleep(0.05)
+    self.assertEqual(sum(f.done() for f in futures), 0)
+    gate.set()
+    db.gather(*futures, timeout=5)
+    self.assertEqual(peak[0], 2)
+    self.assertEqual(len(self.pool.threads), 2)
+
+
+  def test_steps_see_the_callers_context_but_not_its_batch(self):
+    token = tag.set('caller')
+    self.addCleanup(tag.reset, token)
+    with db.batch():
+      f = db.submit(lambda: (tag.get(), loader.batching()))
+      self.assertEqual(f.result(5), ('caller', False))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+from base import Doc, doc_row
+
+from datahog import relationship
+from datahog.const import context, ordering
+
+
+class GetItemTests(base.TestCase):
+  def setUp(self):
+    super(GetItemTests, self).setUp()
+    self.doc = Doc(dh=doc_row(0x101))
+    self.ctx = Doc.links.of_type._ctx
+    self.calls = []
+    patcher = mock.patch.object(relationship, 'list', self.list)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+
+  def list(self, pool, id, ctx, forward=True, limit=100, start=0, **kw):
+    # four relationships, positioned the way the context's ordering spaces
+    # them
+    self.calls.append((start, limit))
+    if context.META[ctx][1].get('ordering') == ordering.SPARSE:
+      positions = [(i + 1) << 16 for i in range(4)]
+    else:
+      positions = list(range(4))
+    rels = [{'base_id': id, 'rel_id': 0x200 + i, 'ctx': ctx, 'value': None,
+             'flags': set(), 'pos': pos} for i, pos in enumerate(positions)]
+    rels = [rel for rel in rels if rel['pos'] >= start][:limit]
+    return rels, rels and rels[-1]['pos'] + 1 or start
+
+
+  def test_dense_reads_the_position(self):
+    self.assertEqual(self.doc.links[2].rel_id, 0x202)
+    self.assertEqual(self.calls, [(2, 1)])
+
+
+  def test_sparse_reads_by_offset(self):
+    with mock.patch.dict(context.META[self.ctx][1],
+                         {'ordering': ordering.SPARSE}):
+      self.assertEqual(self.doc.links[2].rel_id, 0x202)
+    self.assertEqual(self.calls, [(0, 3)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,153 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+from base import Doc, doc_row
+
+from datahog import prop
+from databacon import db, loader
+
+
+def prop_row(key, value):
+  return {'base_id': key[0], 'ctx': key[1], 'value': value, 'flags': set()}
+
+
+class BatchTests(base.TestCase):
+  def setUp(self):
+    super(BatchTests, self).setUp()
+    self.batch_get = mock.Mock(side_effect=lambda pool, keys, **kw:
+      [prop_row(key, 'title %x' % key[0]) for key in keys])
+    patcher = mock.patch.object(prop, 'batch_get', self.batch_get)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    self.docs = [Doc(dh=doc_row(0x101)), Doc(dh=doc_row(0x202))]
+
+
+  def test_reads_in_a_block_go_in_one_query(self):
+    with db.batch():
+      titles = [doc.title() for doc in self.docs]
+      self.assertFalse(self.batch_get.called)
+
+    self.assertEqual(self.batch_get.call_count, 1)
+    self.assertEqual(self.batch_get.call_args[0][1],
+                     [(0x101, Doc.title._ctx), (0x202, Doc.title._ctx)])
+    self.assertEqual([t.value for t in titles], ['title 101', 'title 202'])
+
+
+  def test_a_pending_value_sends_the_batch_early(self):
+    with db.batch():
+      first = self.docs[0].title()
+      self.assertEqual(first.value, 'title 101')
+      second = self.docs[1].title()
+      self.assertEqual(self.batch_get.call_count, 1)
+
+    self.assertEqual(self.batch_get.call_count, 2)
+    self.assertEqual(second.value, 'title 202')
+
+
+  def test_nested_blocks_join_the_outer_one(self):
+    with db.batch():
+      first = self.docs[0].title()
+      with db.batch():
+        second = self.docs[1].title()
+      self.assertFalse(self.batch_get.called)
+
+    self.assertEqual(self.batch_get.call_count, 1)
+    self.assertEqual((first.value, second.value), ('title 101', 'title 202'))
+
+
+  def test_reads_outside_a_block_are_made_on_the_spot(self):
+    self.assertEqual(self.docs[0].title().value, 'title 101')
+    self.assertEqual(self.batch_get.call_count, 1)
+
+
+  def test_a_key_is_read_once(self):
+    b = loader.Batch()
+    fetch = mock.Mock(return_value=['a'])
+    got = []
+    first = b.load(fetch, 1, got.append)
+    self.assertIs(b.load(fetch, 1, got.append), first)
+    b.dispatch()
+
+    fetch.assert_called_once_with([1])
+    self.assertEqual(got, ['a', 'a'])
+
+
+  def test_errors_reach_every_read(self):
+    b = loader.Batch()
+    fetch = mock.Mock(side_effect=ValueError())
+    pending = [b.load(fetch, key, lambda result: None) for key in (1, 2)]
+    b.dispatch()
+
+    for p in pending:
+      self.assertRaises(ValueError, p.wait)
+
+
+class GatedPool(base.FakePool):
+  ''' holds TickBatch's dispatch until the test opens the gate '''
+
+  def __init__(self):
+    super(GatedPool, self).__init__()
+    self.gate = threading.Event()
+
+
+  def _pause(self, ms):
+    self.gate.wait(5)
+
+
+class TickBatchTests(base.TestCase):
+  def setUp(self):
+    super(TickBatchTests, self).setUp()
+    db.pool = self.pool = GatedPool()
+    loader.ticks = self.ticks = loader.TickBatch()
+    self.addCleanup(setattr, loader, 'ticks', None)
+    self.fetched = []
+
+
+  def fetch(self, keys):
+    self.fetched.append(sorted(keys))
+    return [key * 10 for key in keys]
+
+
+  def test_concurrent_reads_share_a_query(self):
+    got = {}
+
+    def read(key):
+      loader.load(self.fetch, key, lambda result: got.update({key: result}))
+
+    readers = [threading.Thread(target=read, args=(key,)) for key in (1, 2, 3)]
+    for t in readers:
+      t.start()
+    deadline = time.time() + 5
+    while len(self.ticks.queues.get(self.fetch, ())) < 3:
+      self.assertLess(time.time(), deadline)
+      time.sleep(0.001)
+    # each reader is blocked on the one dispatch they all queued for
+    self.assertEqual(len(self.pool.threads), 1)
+    self.pool.gate.set()
+    for t in readers:
+      t.join(5)
+
+    self.assertEqual(self.fetched, [[1, 2, 3]])
+    self.assertEqual(got, {1: 10, 2: 20, 3: 30})
+
+
+  def test_a_later_read_schedules_another_dispatch(self):
+    self.pool.gate.set()
+    got = []
+    loader.load(self.fetch, 1, got.append)
+    loader.load(self.fetch, 2, got.append)
+
+    self.assertEqual(self.fetched, [[1], [2]])
+    self.assertEqual(got, [10, 20])
+    self.assertEqual(len(self.pool.threads), 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import base
+from base import Doc, doc_row
+
+from datahog import prop
+from datahog.unit import UnitOfWork
+from databacon import unit
+
+
+class SaveTests(base.TestCase):
+  ''' what Node.save queues, with the queued writes recorded rather than
+  sent '''
+
+  def setUp(self):
+    super(SaveTests, self).setUp()
+    self.queued = []
+    for name in ('update_node', 'set_node_flags', 'set_prop',
+                 'set_prop_flags'):
+      patcher = mock.patch.object(unit.Txn, name, self.recorder(name))
+      patcher.start()
+      self.addCleanup(patcher.stop)
+    patcher = mock.patch.object(UnitOfWork, 'commit', lambda self: None)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+    patcher = mock.patch.object(prop, 'batch_get', lambda pool, keys, **kw:
+      [{'base_id': key[0], 'ctx': key[1], 'value': 'stored', 'flags': set()}
+       for key in keys])
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+    self.doc = Doc(dh=doc_row(0x101, {'n': 1}))
+    self.doc.title()
+
+
+  def recorder(self, name):
+    def record(txn, *args, **kw):
+      self.queued.append((name,) + args)
+    return record
+
+
+  def names(self):
+    return [q[0] for q in self.queued]
+
+
+  def test_unchanged_writes_nothing(self):
+    self.doc.save()
+    self.assertEqual(self.queued, [])
+
+
+  def test_only_the_value(self):
+    self.doc.value = {'n': 2}
+    self.doc.save()
+    self.assertEqual(self.queued, [
+      ('update_node', 0x101, Doc._ctx, {'n': 2})])
+
+
+  def test_only_the_changed_prop(self):
+    self.doc.views()
+    self.doc.title.value = 'changed'
+    self.doc.save()
+    self.assertEqual(self.queued, [
+      ('set_prop', 0x101, Doc.title._ctx, 'changed')])
+
+
+  def test_only_the_flags(self):
+    self.doc.flags.starred = True
+    self.doc.save()
+    self.assertEqual(self.names(), ['set_node_flags'])
+
+
+  def test_a_value_changed_back_isnt_written(self):
+    self.doc.title.value = 'changed'
+    self.doc.title.value = 'stored'
+    self.doc.save()
+    self.assertEqual(self.queued, [])
+
+
+  def test_saved_values_are_clean(self):
+    self.doc.value = {'n': 2}
+    self.doc.title.value = 'changed'
+    self.doc.save()
+    self.assertFalse(self.doc.dirty or self.doc.title.dirty)
+
+    self.queued[:] = []
+    self.doc.save()
+    self.assertEqual(self.queued, [])
+
+
+  def test_prop_save_outside_a_txn(self):
+    with mock.patch.object(prop, 'set') as set:
+      self.assertEqual(self.doc.title.save(), (False, False))
+      self.assertFalse(set.called)
+
+
+if __name__ == '__main__':
+  unittest.main()